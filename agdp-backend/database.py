@@ -1,15 +1,73 @@
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, Boolean, JSON
+from sqlalchemy import event, func, literal, select, true, Column, Index, Integer, String, Text, DateTime, Boolean, JSON, LargeBinary
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.types import TypeDecorator
 from datetime import datetime
+import json
+import orjson
 
-DATABASE_URL = "sqlite:///./agdp.db"
+DATABASE_URL = "sqlite+aiosqlite:///./agdp.db"
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Bump whenever init_db needs to create new tables or indexes, or re-run
+# the settings seed
+SCHEMA_VERSION = 3
+
+DEFAULT_SETTINGS = {
+    "llm_model": "gpt-4",
+    "storage_path": "./pipelines",
+    "llm_api_key": "",
+    "llm_base_url": "https://api.openai.com/v1",
+}
+
+# Keep a small pool of warm connections so each request reuses an open
+# file handle and SQLite page cache instead of reopening the database
+engine = create_async_engine(
+    DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=AsyncAdaptedQueuePool,
+    pool_size=5,
+    max_overflow=10,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+)
+
+
+@event.listens_for(engine.sync_engine, "connect")
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    """Enable WAL so readers don't block on writers, and relax fsync to NORMAL"""
+    cursor = dbapi_connection.cursor()
+    for pragma in (
+        "PRAGMA journal_mode=WAL",
+        "PRAGMA synchronous=NORMAL",
+        "PRAGMA temp_store=memory",
+        "PRAGMA cache_size=-64000",
+        "PRAGMA mmap_size=268435456",
+    ):
+        cursor.execute(pragma)
+    cursor.close()
+
+
+# Objects keep their loaded state after commit, so handlers can return them
+# without a refresh round-trip
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
 
+class ORJSONBlob(TypeDecorator):
+    """JSON value stored as orjson-encoded bytes instead of stdlib-encoded text"""
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else orjson.dumps(value)
+
+    def process_result_value(self, value, dialect):
+        # orjson.loads also accepts the str values left by the old JSON column
+        return None if value is None else orjson.loads(value)
+
+
 class Pipeline(Base):
     __tablename__ = "pipelines"
 
@@ -44,15 +102,21 @@ class Execution(Base):
     __tablename__ = "executions"
 
     id = Column(Integer, primary_key=True, index=True)
-    pipeline_id = Column(Integer, index=True)
+    pipeline_id = Column(Integer)
     status = Column(String, default="running")  # running, completed, failed
-    logs = Column(JSON, default=list)
+    logs = Column(ORJSONBlob, default=list)
     output = Column(Text, nullable=True)
     started_at = Column(DateTime, default=datetime.utcnow)
     completed_at = Column(DateTime, nullable=True)
 
+    # Covers "WHERE pipeline_id = ? ORDER BY started_at DESC" without a sort
+    __table_args__ = (
+        Index("ix_exec_pipeline_started", "pipeline_id", started_at.desc()),
+    )
+
 
 class Settings(Base):
+    # Legacy one-row-per-key store; only read to seed AppConfig on older databases
     __tablename__ = "settings"
 
     id = Column(Integer, primary_key=True, index=True)
@@ -61,13 +125,56 @@ class Settings(Base):
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
 
-def init_db():
-    Base.metadata.create_all(bind=engine)
+class AppConfig(Base):
+    # Single row (id=1) holding every setting as one JSON document
+    __tablename__ = "app_config"
+
+    id = Column(Integer, primary_key=True)
+    data = Column(JSON, default=dict)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+async def init_db():
+    """Bring the schema and seeded settings up to SCHEMA_VERSION"""
+    async with engine.begin() as conn:
+        # The drivers don't open a transaction before DDL, so take the write
+        # lock up front; workers booting together then migrate one at a time
+        # and later ones see the bumped version
+        await conn.exec_driver_sql("BEGIN IMMEDIATE")
+        # The version lives in the database file itself, so a fresh or
+        # replaced database is always migrated
+        result = await conn.exec_driver_sql("PRAGMA user_version")
+        if result.scalar() >= SCHEMA_VERSION:
+            return
+        
+        await conn.run_sync(Base.metadata.create_all)
+        # create_all skips tables that already exist, so add any new
+        # indexes to databases created before they were declared
+        for index in Execution.__table__.indexes:
+            await conn.run_sync(index.create, checkfirst=True)
+        # Superseded by ix_exec_pipeline_started
+        await conn.exec_driver_sql("DROP INDEX IF EXISTS ix_executions_pipeline_id")
+        
+        # Seed default settings with a single INSERT ... SELECT ... ON
+        # CONFLICT DO NOTHING, merging in values from the legacy key/value
+        # table inside SQLite; an existing config row is left untouched.
+        # This shares the transaction with the version bump below, so no
+        # worker can see the new version without the seeded row.
+        legacy = select(func.json_group_object(Settings.key, Settings.value)).scalar_subquery()
+        seed = select(
+            literal(1),
+            func.json_patch(json.dumps(DEFAULT_SETTINGS), legacy),
+            literal(datetime.utcnow())
+        ).where(true())  # SQLite needs a WHERE before ON CONFLICT in INSERT ... SELECT
+        await conn.execute(
+            sqlite_insert(AppConfig)
+            .from_select(["id", "data", "updated_at"], seed)
+            .on_conflict_do_nothing(index_elements=["id"])
+        )
+        
+        await conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -1,11 +1,19 @@
 from fastapi import FastAPI, Depends, HTTPException, status
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel
+from sqlalchemy import func, insert, select
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Dict, List, Optional, Type, TypeVar
+import asyncio
 import json
+import httpx
 from datetime import datetime
 
-from database import get_db, init_db, Pipeline, Execution, Settings
+from database import (
+    DEFAULT_SETTINGS, SessionLocal, engine, get_db, init_db, Pipeline, Execution, AppConfig
+)
 from models import (
     PipelineCreate, PipelineUpdate, PipelineResponse, PipelineListResponse,
     ExecutionCreate, ExecutionResponse, SettingsUpdate, SettingsResponse,
@@ -13,10 +21,34 @@ from models import (
 )
 from pipeline_generator import get_generator
 
+ResponseT = TypeVar("ResponseT", bound=BaseModel)
+
+# Write endpoints finish with their session before the response is sent, so
+# the connection is back in the pool by the time the client sees the result.
+# Reads keep the default scope and release their session after the response.
+TxSession = Depends(get_db, scope="function")
+
 app = FastAPI(
     title="AGDP API",
     description="AI-Generated Data Pipelines Backend",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
+)
+
+# In-process copy of the stored settings. Reads compare app_config.updated_at
+# against the copy and only reload the JSON document when another worker
+# (or this one) has written a newer row.
+_settings_cache: Dict[str, str] = {}
+_settings_updated_at: Optional[datetime] = None
+_settings_lock = asyncio.Lock()
+
+# Static log lines emitted by the simulated pipeline run
+_EXECUTION_LOG_TEMPLATE = (
+    ("info", "Execution started"),
+    ("info", "Running extract phase..."),
+    ("info", "Running transform phase..."),
+    ("info", "Running load phase..."),
+    ("success", "Execution completed successfully"),
 )
 
 # CORS configuration
@@ -31,23 +63,27 @@ app.add_middleware(
 
 @app.on_event("startup")
 async def startup_event():
-    """Initialize database on startup"""
-    init_db()
+    """Initialize database and shared HTTP client on startup"""
+    app.state.http_client = httpx.AsyncClient()
+    await init_db()
     
-    # Initialize default settings if not exist
-    db = next(get_db())
-    try:
-        if not db.query(Settings).filter(Settings.key == "llm_model").first():
-            default_settings = [
-                Settings(key="llm_model", value="gpt-4"),
-                Settings(key="storage_path", value="./pipelines"),
-                Settings(key="llm_api_key", value=""),
-                Settings(key="llm_base_url", value="https://api.openai.com/v1"),
-            ]
-            db.add_all(default_settings)
-            db.commit()
-    finally:
-        db.close()
+    # init_db has committed the seeded config row by the time it returns
+    async with SessionLocal() as db:
+        await _load_settings(db)
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release the shared HTTP client and pooled database connections"""
+    await app.state.http_client.aclose()
+    await engine.dispose()
+
+
+def _construct(response_cls: Type[ResponseT], obj) -> ResponseT:
+    """Build a response model from a trusted ORM row without re-running validation"""
+    return response_cls.model_construct(
+        **{name: getattr(obj, name) for name in response_cls.model_fields}
+    )
 
 
 @app.get("/")
@@ -58,44 +94,50 @@ async def root():
 
 # Pipeline endpoints
 @app.post("/api/pipelines", response_model=PipelineResponse, status_code=status.HTTP_201_CREATED)
-async def create_pipeline(pipeline: PipelineCreate, db: Session = Depends(get_db)):
+async def create_pipeline(pipeline: PipelineCreate, db: AsyncSession = TxSession):
     """Create a new pipeline"""
-    db_pipeline = Pipeline(
-        name=pipeline.name,
-        description=pipeline.description,
-        prompt=pipeline.prompt,
-        use_polars=pipeline.use_polars,
-        use_duckdb=pipeline.use_duckdb,
-        use_soda=pipeline.use_soda,
-        use_prefect=pipeline.use_prefect,
-        status="draft"
-    )
-    db.add(db_pipeline)
-    db.commit()
-    db.refresh(db_pipeline)
+    # INSERT ... RETURNING hands back the full row, defaults included, in
+    # one statement instead of an insert followed by a re-select
+    stmt = insert(Pipeline).values(**pipeline.dict(), status="draft").returning(Pipeline)
+    db_pipeline = await db.scalar(stmt)
+    await db.commit()
     return db_pipeline
 
 
-@app.get("/api/pipelines", response_model=List[PipelineListResponse])
-async def list_pipelines(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+# Columns selected by list_pipelines, derived from the response model so the
+# two can't drift apart
+_PIPELINE_LIST_COLUMNS = tuple(getattr(Pipeline, name) for name in PipelineListResponse.model_fields)
+
+
+@app.get("/api/pipelines", response_model=None, responses={200: {"model": List[PipelineListResponse]}})
+async def list_pipelines(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
     """List all pipelines"""
-    pipelines = db.query(Pipeline).order_by(Pipeline.created_at.desc()).offset(skip).limit(limit).all()
-    return pipelines
+    # Select the list columns as plain rows and hand them straight to
+    # orjson, skipping ORM hydration and the default encoder
+    result = await db.execute(
+        select(*_PIPELINE_LIST_COLUMNS)
+        .order_by(Pipeline.created_at.desc())
+        .offset(skip)
+        .limit(limit)
+    )
+    return ORJSONResponse([dict(row) for row in result.mappings()])
 
 
-@app.get("/api/pipelines/{pipeline_id}", response_model=PipelineResponse)
-async def get_pipeline(pipeline_id: int, db: Session = Depends(get_db)):
+@app.get("/api/pipelines/{pipeline_id}", response_model=None, responses={200: {"model": PipelineResponse}})
+async def get_pipeline(pipeline_id: int, db: AsyncSession = Depends(get_db)):
     """Get pipeline by ID"""
-    pipeline = db.query(Pipeline).filter(Pipeline.id == pipeline_id).first()
+    # Primary-key lookups go through Session.get, which checks the identity
+    # map first and returns None for a missing row
+    pipeline = await db.get(Pipeline, pipeline_id)
     if not pipeline:
         raise HTTPException(status_code=404, detail="Pipeline not found")
-    return pipeline
+    return _construct(PipelineResponse, pipeline)
 
 
 @app.put("/api/pipelines/{pipeline_id}", response_model=PipelineResponse)
-async def update_pipeline(pipeline_id: int, pipeline_update: PipelineUpdate, db: Session = Depends(get_db)):
+async def update_pipeline(pipeline_id: int, pipeline_update: PipelineUpdate, db: AsyncSession = TxSession):
     """Update pipeline"""
-    pipeline = db.query(Pipeline).filter(Pipeline.id == pipeline_id).first()
+    pipeline = await db.get(Pipeline, pipeline_id)
     if not pipeline:
         raise HTTPException(status_code=404, detail="Pipeline not found")
     
@@ -104,40 +146,36 @@ async def update_pipeline(pipeline_id: int, pipeline_update: PipelineUpdate, db:
         setattr(pipeline, field, value)
     
     pipeline.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(pipeline)
+    await db.commit()
     return pipeline
 
 
 @app.delete("/api/pipelines/{pipeline_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_pipeline(pipeline_id: int, db: Session = Depends(get_db)):
+async def delete_pipeline(pipeline_id: int, db: AsyncSession = TxSession):
     """Delete pipeline"""
-    pipeline = db.query(Pipeline).filter(Pipeline.id == pipeline_id).first()
+    pipeline = await db.get(Pipeline, pipeline_id)
     if not pipeline:
         raise HTTPException(status_code=404, detail="Pipeline not found")
     
-    db.delete(pipeline)
-    db.commit()
+    await db.delete(pipeline)
+    await db.commit()
     return None
 
 
 @app.post("/api/pipelines/{pipeline_id}/generate", response_model=PipelineResponse)
-async def generate_pipeline_code(pipeline_id: int, db: Session = Depends(get_db)):
+async def generate_pipeline_code(pipeline_id: int, db: AsyncSession = TxSession):
     """Generate pipeline code using LLM"""
-    pipeline = db.query(Pipeline).filter(Pipeline.id == pipeline_id).first()
+    pipeline = await db.get(Pipeline, pipeline_id)
     if not pipeline:
         raise HTTPException(status_code=404, detail="Pipeline not found")
     
-    # Get settings
-    settings = {}
-    for setting in db.query(Settings).all():
-        settings[setting.key] = setting.value
-    
     # Generate code
+    settings = await _load_settings(db)
     generator = get_generator(
         llm_model=settings.get("llm_model", "gpt-4"),
         api_key=settings.get("llm_api_key"),
-        base_url=settings.get("llm_base_url")
+        base_url=settings.get("llm_base_url"),
+        http_client=app.state.http_client
     )
     
     result = await generator.generate_pipeline(
@@ -156,16 +194,15 @@ async def generate_pipeline_code(pipeline_id: int, db: Session = Depends(get_db)
     pipeline.status = "ready"
     pipeline.updated_at = datetime.utcnow()
     
-    db.commit()
-    db.refresh(pipeline)
+    await db.commit()
     return pipeline
 
 
 # Execution endpoints
 @app.post("/api/executions", response_model=ExecutionResponse, status_code=status.HTTP_201_CREATED)
-async def create_execution(execution: ExecutionCreate, db: Session = Depends(get_db)):
+async def create_execution(execution: ExecutionCreate, db: AsyncSession = TxSession):
     """Start pipeline execution"""
-    pipeline = db.query(Pipeline).filter(Pipeline.id == execution.pipeline_id).first()
+    pipeline = await db.get(Pipeline, execution.pipeline_id)
     if not pipeline:
         raise HTTPException(status_code=404, detail="Pipeline not found")
     
@@ -173,51 +210,66 @@ async def create_execution(execution: ExecutionCreate, db: Session = Depends(get
         raise HTTPException(status_code=400, detail="Pipeline is not ready for execution")
     
     # Create execution record
-    db_execution = Execution(
+    now = datetime.utcnow()
+    now_iso = now.isoformat()
+    stmt = insert(Execution).values(
         pipeline_id=execution.pipeline_id,
-        status="running",
+        status="completed",
         logs=[
-            {"timestamp": datetime.utcnow().isoformat(), "level": "info", "message": "Execution started"},
-            {"timestamp": datetime.utcnow().isoformat(), "level": "info", "message": "Running extract phase..."},
-            {"timestamp": datetime.utcnow().isoformat(), "level": "info", "message": "Running transform phase..."},
-            {"timestamp": datetime.utcnow().isoformat(), "level": "info", "message": "Running load phase..."},
-            {"timestamp": datetime.utcnow().isoformat(), "level": "success", "message": "Execution completed successfully"},
+            {"timestamp": now_iso, "level": level, "message": message}
+            for level, message in _EXECUTION_LOG_TEMPLATE
         ],
         output="Pipeline executed successfully. Processed 1000 rows.",
-        completed_at=datetime.utcnow()
-    )
-    db_execution.status = "completed"
-    
-    db.add(db_execution)
-    db.commit()
-    db.refresh(db_execution)
+        started_at=now,
+        completed_at=now
+    ).returning(Execution)
+    db_execution = await db.scalar(stmt)
+    await db.commit()
     return db_execution
 
 
-@app.get("/api/executions/{execution_id}", response_model=ExecutionResponse)
-async def get_execution(execution_id: int, db: Session = Depends(get_db)):
+@app.get("/api/executions/{execution_id}", response_model=None, responses={200: {"model": ExecutionResponse}})
+async def get_execution(execution_id: int, db: AsyncSession = Depends(get_db)):
     """Get execution by ID"""
-    execution = db.query(Execution).filter(Execution.id == execution_id).first()
+    execution = await db.get(Execution, execution_id)
     if not execution:
         raise HTTPException(status_code=404, detail="Execution not found")
-    return execution
+    return _construct(ExecutionResponse, execution)
 
 
-@app.get("/api/pipelines/{pipeline_id}/executions", response_model=List[ExecutionResponse])
-async def list_pipeline_executions(pipeline_id: int, db: Session = Depends(get_db)):
+@app.get(
+    "/api/pipelines/{pipeline_id}/executions",
+    response_model=None,
+    responses={200: {"model": List[ExecutionResponse]}}
+)
+async def list_pipeline_executions(pipeline_id: int, db: AsyncSession = Depends(get_db)):
     """List executions for a pipeline"""
-    executions = db.query(Execution).filter(Execution.pipeline_id == pipeline_id).order_by(Execution.started_at.desc()).all()
-    return executions
+    result = await db.execute(
+        select(Execution).where(Execution.pipeline_id == pipeline_id).order_by(Execution.started_at.desc())
+    )
+    return [_construct(ExecutionResponse, execution) for execution in result.scalars()]
 
 
 # Settings endpoints
-@app.get("/api/settings", response_model=SettingsResponse)
-async def get_settings(db: Session = Depends(get_db)):
-    """Get current settings"""
-    settings = {}
-    for setting in db.query(Settings).all():
-        settings[setting.key] = setting.value
-    
+def _store_settings(data: Optional[Dict[str, str]], updated_at: Optional[datetime]):
+    """Replace the in-process settings copy"""
+    global _settings_updated_at
+    _settings_cache.clear()
+    _settings_cache.update(DEFAULT_SETTINGS if data is None else data)
+    _settings_updated_at = updated_at
+
+
+async def _load_settings(db: AsyncSession) -> Dict[str, str]:
+    """Return the cached settings, reloading them if app_config has changed"""
+    updated_at = await db.scalar(select(AppConfig.updated_at).where(AppConfig.id == 1))
+    if updated_at is None or updated_at != _settings_updated_at:
+        data = await db.scalar(select(AppConfig.data).where(AppConfig.id == 1))
+        _store_settings(data, updated_at)
+    return _settings_cache
+
+
+def _settings_response(settings: dict) -> SettingsResponse:
+    """Build the settings response, filling in defaults for missing keys"""
     return SettingsResponse(
         llm_model=settings.get("llm_model", "gpt-4"),
         storage_path=settings.get("storage_path", "./pipelines"),
@@ -226,24 +278,37 @@ async def get_settings(db: Session = Depends(get_db)):
     )
 
 
+@app.get("/api/settings", response_model=SettingsResponse)
+async def get_settings(db: AsyncSession = Depends(get_db)):
+    """Get current settings"""
+    return _settings_response(await _load_settings(db))
+
+
 @app.put("/api/settings", response_model=SettingsResponse)
-async def update_settings(settings_update: SettingsUpdate, db: Session = Depends(get_db)):
+async def update_settings(settings_update: SettingsUpdate, db: AsyncSession = TxSession):
     """Update settings"""
     update_data = settings_update.dict(exclude_unset=True)
     
-    for key, value in update_data.items():
-        setting = db.query(Settings).filter(Settings.key == key).first()
-        if setting:
-            setting.value = value
-            setting.updated_at = datetime.utcnow()
-        else:
-            setting = Settings(key=key, value=value)
-            db.add(setting)
+    if not update_data:
+        return _settings_response(await _load_settings(db))
     
-    db.commit()
+    async with _settings_lock:
+        # Merge into the stored document inside SQLite, so keys another
+        # worker changed since our last read are kept
+        now = datetime.utcnow()
+        stmt = sqlite_insert(AppConfig).values(
+            id=1, data={**DEFAULT_SETTINGS, **update_data}, updated_at=now
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["id"],
+            set_={"data": func.json_patch(AppConfig.data, json.dumps(update_data)), "updated_at": now},
+        ).returning(AppConfig.data)
+        data = await db.scalar(stmt)
+        await db.commit()
+        _store_settings(data, now)
     
     # Return updated settings
-    return await get_settings(db)
+    return _settings_response(_settings_cache)
 
 
 if __name__ == "__main__":